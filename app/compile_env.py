@@ -0,0 +1,60 @@
+"""
+Compile a .env file into app/_env_compiled.py so worker processes load settings from
+bytecode instead of opening and parsing .env on every start.
+
+Usage:
+    python -m app.compile_env [--env-file .env] [--output app/_env_compiled.py]
+
+Only keys that are Settings fields are written (compose/n8n secrets in the same .env are
+skipped). Re-run after every .env change; delete the output file to go back to reading .env.
+"""
+import argparse
+import os
+import sys
+
+from dotenv import dotenv_values
+
+from app.config import Settings
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_env_compiled.py")
+
+HEADER = '"""Generated by `python -m app.compile_env` from {source} – do not edit."""\n\n'
+
+
+def compile_env(env_file: str, output: str) -> int:
+    if not os.path.isfile(env_file):
+        raise FileNotFoundError(f"env file not found: {env_file}")
+    fields = {name.lower() for name in Settings.model_fields}
+    snapshot = {
+        key: value
+        for key, value in dotenv_values(env_file).items()
+        if value is not None and key.lower() in fields
+    }
+    body = "ENV_SNAPSHOT = {\n"
+    for key in sorted(snapshot):
+        body += f"    {key!r}: {snapshot[key]!r},\n"
+    body += "}\n"
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(HEADER.format(source=os.path.basename(env_file)))
+        f.write(body)
+    os.replace(tmp_path, output)
+    return len(snapshot)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compile .env into app/_env_compiled.py")
+    parser.add_argument("--env-file", default=".env", help="Source .env file (default: .env)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Generated module path")
+    args = parser.parse_args(argv)
+    try:
+        count = compile_env(args.env_file, args.output)
+    except FileNotFoundError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"Wrote {count} settings from {args.env_file} to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
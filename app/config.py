@@ -1,23 +1,50 @@
 import os
-from pydantic import Field, validator, field_validator
-from pydantic_settings import BaseSettings
-from functools import lru_cache
-from typing import List, Optional
+import re
+from types import MappingProxyType
+from pydantic import Field, ValidationInfo, field_validator
+from pydantic_settings import (
+    BaseSettings,
+    EnvSettingsSource,
+    NoDecode,
+    PydanticBaseSettingsSource,
+    SettingsConfigDict,
+)
+from functools import cached_property
+from threading import Lock
+from typing import Annotated, Dict, FrozenSet, Mapping, Optional, Tuple, get_origin
 
-def _get_int(name: str, default: int) -> int:
+# Azure valid permission chars (blob service subset): r w d l a c u p t f m e x
+_ALLOWED_SAS_CHARS = frozenset("rwdlacuptfmex")
+
+# One "label=bitrate" entry of QUALITY_BITRATES; malformed entries are skipped
+_QUALITY_BITRATE_RE = re.compile(r"(?:^|,)\s*([^,=]+?)\s*=\s*(-?\d+)\s*(?=,|$)")
+
+
+def _load_env_snapshot() -> Optional[Dict[str, str]]:
     """
-    Robust integer environment parser: strips inline comments and whitespace.
-    Raises ValueError with clear message if conversion fails.
+    Return ENV_SNAPSHOT from app/_env_compiled.py (written by `python -m app.compile_env`), or None.
     """
-    raw = os.getenv(name)
-    if raw is None or raw.strip() == "":
-        return default
-    # Strip any inline comment after a '#'
-    raw = raw.split("#", 1)[0].strip()
     try:
-        return int(raw)
-    except ValueError:
-        raise ValueError(f"Environment variable {name} must be an integer, got {raw!r}")
+        from app._env_compiled import ENV_SNAPSHOT
+    except ImportError:
+        return None
+    return ENV_SNAPSHOT
+
+
+class CompiledEnvSettingsSource(EnvSettingsSource):
+    """
+    Drop-in replacement for the .env source that reads a precompiled snapshot instead of
+    opening and parsing the file (once per worker process). Real env vars still take precedence.
+    """
+
+    def __init__(self, settings_cls, snapshot: Mapping[str, str]):
+        self._snapshot = snapshot
+        super().__init__(settings_cls)
+
+    def _load_env_vars(self) -> Mapping[str, Optional[str]]:
+        if self.case_sensitive:
+            return dict(self._snapshot)
+        return {k.lower(): v for k, v in self._snapshot.items()}
 
 
 class Settings(BaseSettings):
@@ -27,79 +54,98 @@ class Settings(BaseSettings):
     """
 
     # Download / processing
-    YT_DLP_OUTPUT_DIR: str = Field(default=os.getenv("YT_DLP_OUTPUT_DIR", "/app/downloads"))
-    DEFAULT_AUDIO_FORMAT: str = Field(default=os.getenv("DEFAULT_AUDIO_FORMAT", "mp3"))
-    DEFAULT_AUDIO_QUALITY: str = Field(default=os.getenv("DEFAULT_AUDIO_QUALITY", "best"))  # best|high|medium|low
-    ALLOWED_FORMATS: str = Field(default=os.getenv("ALLOWED_FORMATS", "mp3,m4a,ogg,wav"))
-    MAX_CONCURRENT_DOWNLOADS: int = Field(default=_get_int("MAX_CONCURRENT_DOWNLOADS", 3))
-    QUALITY_BITRATES: str = Field(default=os.getenv("QUALITY_BITRATES", "best=0,high=192,medium=128,low=64"))
+    YT_DLP_OUTPUT_DIR: str = "/app/downloads"
+    DEFAULT_AUDIO_FORMAT: str = "mp3"
+    DEFAULT_AUDIO_QUALITY: str = "best"  # best|high|medium|low
+    # CSV / k=v strings are parsed once at construction (see validators below); NoDecode keeps
+    # pydantic-settings from treating the raw env value as JSON.
+    ALLOWED_FORMATS: Annotated[FrozenSet[str], NoDecode] = Field(default="mp3,m4a,ogg,wav", validate_default=True)
+    MAX_CONCURRENT_DOWNLOADS: int = 3  # async job workers
+    MAX_CONCURRENT_SYNC_DOWNLOADS: int = 3  # in-flight POST /download requests (separate pool)
+    QUALITY_BITRATES: Annotated[Mapping[str, int], NoDecode] = Field(default="best=0,high=192,medium=128,low=64", validate_default=True)
 
     # Cleanup / retention
-    MAX_FILE_AGE_HOURS: int = Field(default=_get_int("MAX_FILE_AGE_HOURS", 6))
-    CLEANUP_INTERVAL_SECONDS: int = Field(default=_get_int("CLEANUP_INTERVAL_SECONDS", 600))
-    MIN_FREE_DISK_MB: int = Field(default=_get_int("MIN_FREE_DISK_MB", 100))
+    MAX_FILE_AGE_HOURS: int = 6
+    CLEANUP_INTERVAL_SECONDS: int = 600
+    MIN_FREE_DISK_MB: int = 100
+    # Async job history: finished job records are dropped after this age, or oldest-first
+    # once more than MAX_JOBS records are held (pending/running jobs are never evicted)
+    MAX_JOB_RETENTION_SECONDS: int = 21600
+    MAX_JOBS: int = 1000
+    # Job queue/registry backend: memory (single process) | redis (shared across uvicorn workers)
+    JOB_BACKEND: str = "memory"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_KEY_PREFIX: str = "y2b:"
+    # On shutdown, running jobs get this long to finish before they are cancelled
+    JOB_DRAIN_TIMEOUT_SECONDS: int = 20
 
     # Logging
-    LOG_LEVEL: str = Field(default=os.getenv("LOG_LEVEL", "INFO"))
+    LOG_LEVEL: str = "INFO"
 
     # Domain restrictions (comma-separated hostnames; if empty => allow all)
-    ALLOWED_DOMAINS: str = Field(default=os.getenv("ALLOWED_DOMAINS", "youtube.com,youtu.be"))
+    # Stored as a tuple so is_domain_allowed() can hand it straight to str.endswith
+    ALLOWED_DOMAINS: Annotated[Tuple[str, ...], NoDecode] = Field(default="youtube.com,youtu.be", validate_default=True)
 
     # Azure Blob Storage (optional)
     # Two credential modes supported:
     # 1) Connection string (full access) via AZURE_STORAGE_CONNECTION_STRING
     # 2) Pre-generated SAS token (no account key) via AZURE_BLOB_ACCOUNT_URL + AZURE_SAS_TOKEN
-    AZURE_UPLOAD_ENABLED: bool = Field(default=os.getenv("AZURE_UPLOAD_ENABLED", "false").lower() in ("1", "true", "yes", "on"))
-    AZURE_STORAGE_CONNECTION_STRING: Optional[str] = Field(default=os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
-    AZURE_BLOB_ACCOUNT_URL: Optional[str] = Field(default=os.getenv("AZURE_BLOB_ACCOUNT_URL"))  # e.g. https://mystorage.blob.core.windows.net
-    AZURE_SAS_TOKEN: Optional[str] = Field(default=os.getenv("AZURE_SAS_TOKEN"))  # Either with or without leading '?'
-    AZURE_BLOB_CONTAINER_NAME: str = Field(default=os.getenv("AZURE_BLOB_CONTAINER_NAME", "audio-files"))
-    AZURE_BLOB_PREFIX: str = Field(default=os.getenv("AZURE_BLOB_PREFIX", ""))  # Optional path prefix in container
-    AZURE_GENERATE_SAS: bool = Field(default=os.getenv("AZURE_GENERATE_SAS", "false").lower() in ("1", "true", "yes", "on"))
-    AZURE_SAS_EXPIRY_SECONDS: int = Field(default=int(os.getenv("AZURE_SAS_EXPIRY_SECONDS", "3600")))
-    AZURE_SAS_PERMISSIONS: str = Field(default=os.getenv("AZURE_SAS_PERMISSIONS", "r"))  # Typical: r (read)
+    # Unset credentials are "" (never None), so presence checks are plain truthiness
+    # Flags accept 1/0, true/false, yes/no, on/off (pydantic bool parsing; anything else is an error)
+    AZURE_UPLOAD_ENABLED: bool = False
+    AZURE_STORAGE_CONNECTION_STRING: str = ""
+    AZURE_BLOB_ACCOUNT_URL: str = ""  # e.g. https://mystorage.blob.core.windows.net
+    AZURE_SAS_TOKEN: str = ""  # Either with or without leading '?'
+    AZURE_BLOB_CONTAINER_NAME: str = "audio-files"
+    AZURE_BLOB_PREFIX: str = ""  # Optional path prefix in container
+    AZURE_GENERATE_SAS: bool = False
+    AZURE_SAS_EXPIRY_SECONDS: int = 3600
+    AZURE_SAS_PERMISSIONS: str = "r"  # Typical: r (read)
     # When true, remove the local downloaded file immediately after a successful Azure upload
-    AZURE_DELETE_LOCAL_AFTER_UPLOAD: bool = Field(default=os.getenv("AZURE_DELETE_LOCAL_AFTER_UPLOAD", "false").lower() in ("1", "true", "yes", "on"))
- 
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
+    AZURE_DELETE_LOCAL_AFTER_UPLOAD: bool = False
+    # Parallel block uploads per blob
+    AZURE_UPLOAD_CONCURRENCY: int = 8
 
-    @property
-    def allowed_formats_list(self) -> List[str]:
-        return [f.strip().lower() for f in self.ALLOWED_FORMATS.split(",") if f.strip()]
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=False,
+        # .env is shared with compose/n8n (DOMAIN, N8N_*, ...): ignore keys that are not settings
+        extra="ignore",
+        # Read-only after construction: safe to share the singleton across threads/workers
+        frozen=True,
+        # Derived values are parsed once per (singleton) instance, not per access
+        ignored_types=(cached_property,),
+    )
 
-    @property
-    def allowed_domains_list(self) -> List[str]:
-        return [d.strip().lower() for d in self.ALLOWED_DOMAINS.split(",") if d.strip()]
-
-    @property
-    def quality_bitrate_mapping(self) -> dict:
-        mapping = {}
-        for part in self.QUALITY_BITRATES.split(","):
-            if "=" in part:
-                k, v = part.split("=", 1)
-                try:
-                    mapping[k.strip()] = int(v.strip())
-                except ValueError:
-                    continue
-        return mapping
+    @classmethod
+    def settings_customise_sources(
+        cls,
+        settings_cls,
+        init_settings: PydanticBaseSettingsSource,
+        env_settings: PydanticBaseSettingsSource,
+        dotenv_settings: PydanticBaseSettingsSource,
+        file_secret_settings: PydanticBaseSettingsSource,
+    ):
+        # Prefer the compiled .env snapshot when present; fall back to reading .env
+        snapshot = _load_env_snapshot()
+        if snapshot is not None:
+            dotenv_settings = CompiledEnvSettingsSource(settings_cls, snapshot)
+        return init_settings, env_settings, dotenv_settings, file_secret_settings
 
     @property
     def azure_uses_connection_string(self) -> bool:
         return bool(self.AZURE_STORAGE_CONNECTION_STRING)
 
     @property
-    def azure_sas_token_clean(self) -> Optional[str]:
-        if not self.AZURE_SAS_TOKEN:
-            return None
-        return self.AZURE_SAS_TOKEN.lstrip("?").strip()
+    def azure_sas_token_clean(self) -> str:
+        # Normalized at construction (see normalize_sas_token); "" when not configured
+        return self.AZURE_SAS_TOKEN
 
     @property
     def azure_uses_sas(self) -> bool:
         return bool(self.AZURE_BLOB_ACCOUNT_URL and self.azure_sas_token_clean)
 
-    @property
+    @cached_property
     def azure_is_configured(self) -> bool:
         """
         True if feature flag enabled AND (connection string OR (account URL + SAS token)).
@@ -108,20 +154,69 @@ class Settings(BaseSettings):
             return False
         return self.azure_uses_connection_string or self.azure_uses_sas
 
-    @validator("DEFAULT_AUDIO_FORMAT")
-    def validate_default_format(cls, v):
+    def is_domain_allowed(self, host: str) -> bool:
+        """
+        True if host equals or ends with one of ALLOWED_DOMAINS (no restriction when empty).
+        """
+        return not self.ALLOWED_DOMAINS or host.lower().endswith(self.ALLOWED_DOMAINS)
+
+    @field_validator("AZURE_SAS_TOKEN", mode="after")
+    @classmethod
+    def normalize_sas_token(cls, v):
+        # Accept the token with or without its leading '?'; blank means "not configured"
+        return v.strip().lstrip("?").strip()
+
+    @field_validator("ALLOWED_FORMATS", "ALLOWED_DOMAINS", mode="before")
+    @classmethod
+    def _normalize_csv(cls, v, info: ValidationInfo):
+        """
+        Split/strip/lowercase once so readers never re-normalize. Tuple-typed fields get a
+        sorted tuple (for str.endswith), the rest a frozenset (for O(1) membership).
+        """
+        if isinstance(v, str):
+            v = v.split(",")
+        elif not isinstance(v, (list, tuple, set, frozenset)):
+            return v
+        items = {p.strip().lower() for p in v if isinstance(p, str) and p.strip()}
+        if get_origin(cls.model_fields[info.field_name].annotation) is tuple:
+            return tuple(sorted(items))
+        return frozenset(items)
+
+    @field_validator("QUALITY_BITRATES", mode="before")
+    @classmethod
+    def parse_quality_bitrates(cls, v):
+        if not isinstance(v, str):
+            return v
+        return {m.group(1): int(m.group(2)) for m in _QUALITY_BITRATE_RE.finditer(v)}
+
+    @field_validator("QUALITY_BITRATES", mode="after")
+    @classmethod
+    def freeze_quality_bitrates(cls, v):
+        return MappingProxyType(dict(v))
+
+    @field_validator("DEFAULT_AUDIO_FORMAT", "DEFAULT_AUDIO_QUALITY", mode="after")
+    @classmethod
+    def lowercase_defaults(cls, v):
         return v.lower()
 
-    @validator("AZURE_SAS_PERMISSIONS")
+    @field_validator("JOB_BACKEND", mode="after")
+    @classmethod
+    def validate_job_backend(cls, v):
+        v = v.strip().lower()
+        if v not in ("memory", "redis"):
+            raise ValueError("JOB_BACKEND must be 'memory' or 'redis'")
+        return v
+
+    @field_validator("AZURE_SAS_PERMISSIONS", mode="after")
+    @classmethod
     def validate_sas_permissions(cls, v):
-        # Azure valid permission chars (blob service subset): r w d l a c u p t f m e x
-        allowed_chars = set("rwdlacup tfmex".replace(" ", ""))
-        invalid = {ch for ch in v if ch not in allowed_chars}
+        invalid = set(v) - _ALLOWED_SAS_CHARS
         if invalid:
             raise ValueError(f"Invalid Azure SAS permission characters: {''.join(sorted(invalid))}")
         return v
 
-    @validator("AZURE_SAS_EXPIRY_SECONDS")
+    @field_validator("AZURE_SAS_EXPIRY_SECONDS", mode="after")
+    @classmethod
     def validate_sas_expiry(cls, v):
         if v <= 0:
             raise ValueError("AZURE_SAS_EXPIRY_SECONDS must be positive")
@@ -129,20 +224,48 @@ class Settings(BaseSettings):
             raise ValueError("AZURE_SAS_EXPIRY_SECONDS too large (max 604800)")
         return v
 
-    # Pre-parse sanitization for integer fields to allow inline comments in .env
-    @field_validator("MAX_FILE_AGE_HOURS", "CLEANUP_INTERVAL_SECONDS", "MIN_FREE_DISK_MB", "AZURE_SAS_EXPIRY_SECONDS", mode="before")
+    # Pre-parse sanitization to allow inline comments in .env (credentials/paths are left untouched)
+    @field_validator(
+        "MAX_CONCURRENT_DOWNLOADS", "MAX_FILE_AGE_HOURS", "CLEANUP_INTERVAL_SECONDS", "MIN_FREE_DISK_MB",
+        "MAX_CONCURRENT_SYNC_DOWNLOADS", "MAX_JOB_RETENTION_SECONDS", "MAX_JOBS", "JOB_BACKEND",
+        "JOB_DRAIN_TIMEOUT_SECONDS",
+        "AZURE_SAS_EXPIRY_SECONDS", "AZURE_UPLOAD_CONCURRENCY",
+        "DEFAULT_AUDIO_FORMAT", "DEFAULT_AUDIO_QUALITY", "ALLOWED_FORMATS", "QUALITY_BITRATES", "LOG_LEVEL",
+        "ALLOWED_DOMAINS", "AZURE_BLOB_CONTAINER_NAME", "AZURE_SAS_PERMISSIONS",
+        "AZURE_UPLOAD_ENABLED", "AZURE_GENERATE_SAS", "AZURE_DELETE_LOCAL_AFTER_UPLOAD",
+        mode="before",
+    )
     @classmethod
-    def strip_inline_comment_int(cls, v):
+    def strip_inline_comment(cls, v):
         if isinstance(v, str):
             v = v.split("#", 1)[0].strip()
         return v
 
     def ensure_directories(self):
-        os.makedirs(self.YT_DLP_OUTPUT_DIR, exist_ok=True)
+        # Common case is "already exists": a stat is cheaper than a failing mkdir
+        if not os.path.isdir(self.YT_DLP_OUTPUT_DIR):
+            os.makedirs(self.YT_DLP_OUTPUT_DIR, exist_ok=True)
+
+
+_settings: Optional[Settings] = None
+_settings_lock = Lock()
 
 
-@lru_cache
 def get_settings() -> Settings:
-    settings = Settings()
-    settings.ensure_directories()
-    return settings
\ No newline at end of file
+    """
+    Return the process-wide Settings instance, building it on first use.
+    The fast path is a single global read; the lock only guards first construction.
+    Directories are not touched here – call ensure_directories() from app startup.
+    """
+    settings = _settings
+    if settings is None:
+        settings = _init_settings()
+    return settings
+
+
+def _init_settings() -> Settings:
+    global _settings
+    with _settings_lock:
+        if _settings is None:
+            _settings = Settings()
+        return _settings
\ No newline at end of file
@@ -0,0 +1,316 @@
+"""
+Async job queue + registry backends.
+
+JOB_BACKEND=memory (default): asyncio.Queue + OrderedDict in the API process; requires a
+single uvicorn worker.
+JOB_BACKEND=redis: pending jobs in a Redis list, records in per-job hashes and a ZSET index,
+so several uvicorn workers (each running its own job workers) share one queue and registry.
+A popped job stays in its process's processing list until job_done(), so jobs held by a
+process that dies are put back on the queue by the surviving ones (see maintain()).
+
+Records are plain dicts: id, status, created_ns, updated_ns, worker, result, error.
+result is whatever the worker stored (a pydantic model) for memory, its JSON dict for redis.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from itertools import islice
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger("yt-dlp-server")
+
+# Optional Redis dependency (lazy / guarded)
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+# Job states: pending -> running -> completed | error | cancelled
+TERMINAL_JOB_STATES = frozenset({"completed", "error", "cancelled"})
+
+
+def _json_default(obj):
+    # pydantic models (job results)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JobQueueFull(Exception):
+    """Raised by enqueue() when the pending queue is at capacity."""
+
+
+class MemoryJobStore:
+    """
+    In-process backend. The registry is only touched from the event loop thread (coroutines
+    yield only at `await`), so no lock is needed. Insertion order == creation order, newest last.
+    """
+
+    def __init__(self, maxsize: int, max_jobs: int, retention_seconds: int):
+        self.queue: "asyncio.Queue[Tuple[str, dict]]" = asyncio.Queue(maxsize=maxsize)
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._max_jobs = max_jobs
+        self._retention_seconds = retention_seconds
+
+    async def enqueue(self, job_id: str, payload: dict) -> None:
+        try:
+            self.queue.put_nowait((job_id, payload))
+        except asyncio.QueueFull:
+            raise JobQueueFull() from None
+        # No await between put and record creation, so a worker cannot see the job first
+        now_ns = time.time_ns()
+        self._jobs[job_id] = {
+            "id": job_id,
+            "status": "pending",
+            "created_ns": now_ns,
+            "updated_ns": now_ns,
+            "payload": payload,
+        }
+
+    async def next_job(self) -> Tuple[str, dict]:
+        return await self.queue.get()
+
+    async def job_done(self, job_id: str) -> None:
+        self.queue.task_done()
+
+    async def requeue(self, job_id: str, payload: dict) -> None:
+        """Give back a popped job without running it (record stays pending)"""
+        self.queue.task_done()
+        try:
+            self.queue.put_nowait((job_id, payload))
+        except asyncio.QueueFull:
+            pass  # Refilled meanwhile; only reached at shutdown, when the queue is lost anyway
+
+    async def update(self, job_id: str, **fields) -> None:
+        rec = self._jobs.get(job_id)
+        if not rec:
+            return
+        rec.update(fields)
+        now_ns = rec["updated_ns"] = time.time_ns()
+        if fields.get("status") in TERMINAL_JOB_STATES:
+            # Eviction clock for prune()
+            rec["finished_ts"] = now_ns / 1e9
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return self._jobs.get(job_id)
+
+    async def recent(self, limit: int) -> List[dict]:
+        # Newest first: only `limit` records are visited
+        return list(islice(reversed(self._jobs.values()), max(limit, 0)))
+
+    async def prune(self, now: float) -> int:
+        """
+        Drop finished job records older than the retention window, and the oldest finished
+        ones while more than max_jobs records are held. Returns number of records removed.
+        """
+        excess = len(self._jobs) - self._max_jobs
+        removed = 0
+        for job_id, rec in list(self._jobs.items()):  # oldest first
+            finished_ts = rec.get("finished_ts")
+            if finished_ts is None:
+                continue
+            if excess > 0 or now - finished_ts > self._retention_seconds:
+                del self._jobs[job_id]
+                removed += 1
+                excess -= 1
+        return removed
+
+    async def maintain(self) -> None:
+        # Nothing to recover: queued jobs live and die with this process
+        return
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisJobStore:
+    """
+    Shared backend:
+      - {prefix}jobs:pending             list, LPUSH on enqueue / BLMOVE by workers
+      - {prefix}jobs:processing:<store>  list per process of popped, unfinished jobs
+      - {prefix}jobs:consumers           ZSET of store ids scored by last heartbeat
+      - {prefix}job:<id>                 hash per record; expires retention_seconds after
+                                         its last update
+      - {prefix}jobs:index               ZSET of job ids scored by created_ns, capped at max_jobs
+    The queue bound is checked with LLEN before pushing, so it is approximate under
+    concurrent enqueues.
+
+    Delivery is at-least-once: BLMOVE hands a job to this process's processing list in the
+    same step that removes it from pending, and job_done() drops it from there. Processing
+    lists of stores whose heartbeat is older than _CONSUMER_STALE_SECONDS are moved back to
+    pending by maintain(); a process stalled that long may therefore see its job run twice.
+    """
+
+    _INT_FIELDS = ("created_ns", "updated_ns", "worker")
+    _JSON_FIELDS = ("payload", "result")
+    _POP_TIMEOUT_SECONDS = 30
+    _HEARTBEAT_SECONDS = 10
+    _CONSUMER_STALE_SECONDS = 60
+
+    def __init__(self, url: str, prefix: str, maxsize: int, max_jobs: int, retention_seconds: int):
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._pending_key = f"{prefix}jobs:pending"
+        self._index_key = f"{prefix}jobs:index"
+        self._job_prefix = f"{prefix}job:"
+        self._consumers_key = f"{prefix}jobs:consumers"
+        self._processing_prefix = f"{prefix}jobs:processing:"
+        self._store_id = uuid.uuid4().hex
+        self._processing_key = self._processing_prefix + self._store_id
+        # job_id -> entry as stored in the processing list (LREM needs the exact value)
+        self._claimed: dict = {}
+        self._maxsize = maxsize
+        self._max_jobs = max_jobs
+        self._retention_seconds = retention_seconds
+
+    def _encode(self, fields: dict) -> dict:
+        return {
+            k: json.dumps(v, default=_json_default) if k in self._JSON_FIELDS else v
+            for k, v in fields.items()
+            if v is not None
+        }
+
+    def _decode(self, raw: dict) -> dict:
+        rec = dict(raw)
+        for k in self._INT_FIELDS:
+            if k in rec:
+                rec[k] = int(rec[k])
+        for k in self._JSON_FIELDS:
+            if k in rec:
+                rec[k] = json.loads(rec[k])
+        return rec
+
+    async def enqueue(self, job_id: str, payload: dict) -> None:
+        if await self._redis.llen(self._pending_key) >= self._maxsize:
+            raise JobQueueFull()
+        now_ns = time.time_ns()
+        key = self._job_prefix + job_id
+        record = {"id": job_id, "status": "pending", "created_ns": now_ns, "updated_ns": now_ns, "payload": payload}
+        # MULTI/EXEC: the record exists before any worker can pop the job
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=self._encode(record))
+            pipe.expire(key, self._retention_seconds)
+            pipe.zadd(self._index_key, {job_id: now_ns})
+            pipe.zremrangebyrank(self._index_key, 0, -(self._max_jobs + 1))
+            pipe.lpush(self._pending_key, json.dumps([job_id, payload]))
+            await pipe.execute()
+
+    async def next_job(self) -> Tuple[str, dict]:
+        # Bounded BLMOVE so a silently dropped connection cannot park a worker forever. Oldest
+        # entry (right end) moves to our processing list, where it survives until job_done()
+        while True:
+            entry = await self._redis.blmove(
+                self._pending_key, self._processing_key, self._POP_TIMEOUT_SECONDS, src="RIGHT", dest="LEFT"
+            )
+            if entry:
+                job_id, payload = json.loads(entry)
+                self._claimed[job_id] = entry
+                return job_id, payload
+
+    async def job_done(self, job_id: str) -> None:
+        entry = self._claimed.pop(job_id, None)
+        if entry is not None:
+            await self._redis.lrem(self._processing_key, 1, entry)
+
+    async def requeue(self, job_id: str, payload: dict) -> None:
+        """Give back a popped job without running it: back to the head of pending"""
+        entry = self._claimed.pop(job_id, None)
+        if entry is None:
+            return
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(self._processing_key, 1, entry)
+            pipe.rpush(self._pending_key, entry)
+            await pipe.execute()
+
+    async def _requeue_list(self, processing_key: str) -> int:
+        """Move every entry of a processing list back to the head of pending; returns count"""
+        moved = 0
+        # Newest first onto the right end, so the oldest ends up popped first again
+        while (entry := await self._redis.lmove(processing_key, self._pending_key, src="LEFT", dest="RIGHT")) is not None:
+            moved += 1
+            key = self._job_prefix + json.loads(entry)[0]
+            if await self._redis.exists(key):
+                await self._redis.hset(key, mapping={"status": "pending", "updated_ns": time.time_ns()})
+        return moved
+
+    async def maintain(self) -> None:
+        """
+        Heartbeat this store and requeue the processing lists of stores that stopped beating
+        (crashed or killed processes). Runs until cancelled; the first pass covers jobs left
+        over from before this process started.
+        """
+        while True:
+            now = time.time()
+            await self._redis.zadd(self._consumers_key, {self._store_id: now})
+            stale = await self._redis.zrangebyscore(self._consumers_key, "-inf", now - self._CONSUMER_STALE_SECONDS)
+            for store_id in stale:
+                # Each LMOVE is atomic, so peers reclaiming the same store never duplicate a job
+                moved = await self._requeue_list(self._processing_prefix + store_id)
+                await self._redis.zrem(self._consumers_key, store_id)
+                if moved:
+                    logger.warning(f"Requeued {moved} job(s) abandoned by job store {store_id}")
+            await asyncio.sleep(self._HEARTBEAT_SECONDS)
+
+    async def update(self, job_id: str, **fields) -> None:
+        key = self._job_prefix + job_id
+        if not await self._redis.exists(key):
+            return
+        fields["updated_ns"] = time.time_ns()
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=self._encode(fields))
+            pipe.expire(key, self._retention_seconds)
+            await pipe.execute()
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        raw = await self._redis.hgetall(self._job_prefix + job_id)
+        return self._decode(raw) if raw else None
+
+    async def recent(self, limit: int) -> List[dict]:
+        if limit <= 0:
+            return []
+        job_ids = await self._redis.zrevrange(self._index_key, 0, limit - 1)
+        if not job_ids:
+            return []
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.hgetall(self._job_prefix + job_id)
+            raws = await pipe.execute()
+        return [self._decode(raw) for raw in raws if raw]
+
+    async def prune(self, now: float) -> int:
+        """
+        Records expire on their own; drop index entries created before the retention window
+        (their hashes are gone or about to be). Returns number of index entries removed.
+        """
+        cutoff_ns = int((now - self._retention_seconds) * 1e9)
+        return await self._redis.zremrangebyscore(self._index_key, "-inf", cutoff_ns)
+
+    async def close(self) -> None:
+        # Entries still here were popped but never finished (e.g. a worker cancelled mid-BLMOVE
+        # after the server had moved the entry): hand them straight back to the peers
+        try:
+            await self._requeue_list(self._processing_key)
+            await self._redis.zrem(self._consumers_key, self._store_id)
+        finally:
+            await self._redis.aclose()
+
+
+def create_job_store(settings, maxsize: int):
+    if settings.JOB_BACKEND == "redis":
+        if aioredis is None:
+            raise RuntimeError("redis not installed but JOB_BACKEND=redis")
+        return RedisJobStore(
+            settings.REDIS_URL,
+            settings.REDIS_KEY_PREFIX,
+            maxsize=maxsize,
+            max_jobs=settings.MAX_JOBS,
+            retention_seconds=settings.MAX_JOB_RETENTION_SECONDS,
+        )
+    return MemoryJobStore(
+        maxsize=maxsize,
+        max_jobs=settings.MAX_JOBS,
+        retention_seconds=settings.MAX_JOB_RETENTION_SECONDS,
+    )
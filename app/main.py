@@ -1,13 +1,16 @@
 import asyncio
 import os
+import queue
+import re
 import time
 import uuid
 import shutil
 import logging
 from pathlib import Path
-from typing import Optional, List
+from typing import Iterator, Optional, List
 from datetime import datetime, timedelta
 import json
+from urllib.parse import urlsplit
 
 import yt_dlp
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
@@ -16,14 +19,18 @@ from pydantic import BaseModel, HttpUrl
 
 # Optional Azure dependency (lazy / guarded)
 try:
-    from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
+    from azure.core.exceptions import ResourceExistsError
+    from azure.storage.blob import BlobType, generate_blob_sas, BlobSasPermissions
+    from azure.storage.blob.aio import BlobServiceClient
 except ImportError:
+    ResourceExistsError = None
     BlobServiceClient = None
+    BlobType = None
     generate_blob_sas = None
     BlobSasPermissions = None
 
 from app.config import get_settings
-from threading import Lock
+from app.jobs import JobQueueFull, create_job_store
 
 settings = get_settings()
 
@@ -56,57 +63,99 @@ logger.debug(f"Logging initialized at level {_level} ({LOG_LEVEL_NAME})")
 
 app = FastAPI(title="yt-dlp API Server", version="1.2.0")
 
-# Concurrency control
-download_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_DOWNLOADS)
+# Concurrency control: queued jobs are capped by the number of job workers (see
+# startup_event); the synchronous endpoint has its own independent cap so neither
+# path can starve the other.
+sync_download_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_SYNC_DOWNLOADS)
 
 # -----------------------------------------------------------------------------
 # Asynchronous job queue support
 # -----------------------------------------------------------------------------
-# Job states: pending -> running -> completed | error | cancelled
-job_queue: "asyncio.Queue[tuple[str, dict]]" = asyncio.Queue()
-_jobs: dict = {}
-_jobs_lock = Lock()
+# Backend chosen by JOB_BACKEND (see app/jobs.py): in-process by default, Redis to
+# share one queue/registry across uvicorn workers.
+# Bounded so a burst of enqueue requests gets 503 instead of growing memory without limit
+JOB_QUEUE_MAXSIZE = settings.MAX_CONCURRENT_DOWNLOADS * 4
+job_store = create_job_store(settings, JOB_QUEUE_MAXSIZE)
 
 
-def _create_job_record(job_id: str, payload: dict):
-    with _jobs_lock:
-        _jobs[job_id] = {
-            "id": job_id,
-            "status": "pending",
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat(),
-            "payload": payload,
-        }
+# Record timestamps are time.time_ns() integers; they are only formatted as ISO strings
+# when a job is returned by the status/list endpoints.
+def _iso_from_ns(ns: int) -> str:
+    return datetime.utcfromtimestamp(ns / 1e9).isoformat()
 
 
-def _update_job(job_id: str, **fields):
-    with _jobs_lock:
-        rec = _jobs.get(job_id)
-        if not rec:
-            return
-        rec.update(fields)
-        rec["updated_at"] = datetime.utcnow().isoformat()
+# Set on shutdown: workers finish their current job but take no new ones. Workers waiting
+# for a job register in _idle_workers so shutdown can cancel them right away.
+_shutdown_requested = asyncio.Event()
+_jobs_in_flight = 0
+_idle_workers: "set[asyncio.Task]" = set()
 
 
 async def _job_worker(worker_index: int):
+    global _jobs_in_flight
     logger.info(f"Job worker #{worker_index} started")
-    while True:
-        job_id, params = await job_queue.get()
-        _update_job(job_id, status="running", worker=worker_index)
+    task = asyncio.current_task()
+    while not _shutdown_requested.is_set():
+        _idle_workers.add(task)
+        try:
+            job_id, params = await job_store.next_job()
+        finally:
+            _idle_workers.discard(task)
+        if _shutdown_requested.is_set():
+            # Popped after shutdown began: leave it to a live process instead of starting it
+            await job_store.requeue(job_id, params)
+            break
+        _jobs_in_flight += 1
+        # Cookies were written to disk at enqueue time; _perform_download removes the file
+        cookies_path = params.pop("cookies_path", None)
         try:
+            await job_store.update(job_id, status="running", worker=worker_index)
             resp = await _perform_download(
                 url=params["url"],
                 audio_format=params["format"],
                 quality_label=params["quality_label"],
                 bitrate=params["bitrate"],
-                cookies_content=params.get("cookies"),
+                cookies_content=None,
+                cookies_file_path=Path(cookies_path) if cookies_path else None,
             )
-            _update_job(job_id, status="completed", result=resp.dict())
+            # Keep the validated model: status polls return it as-is (Redis stores its JSON)
+            await job_store.update(job_id, status="completed", result=resp)
+        except asyncio.CancelledError:
+            # Shutdown drain timed out with this job still running
+            await job_store.update(job_id, status="cancelled", error="Server shutting down")
+            raise
         except Exception as e:
-            _update_job(job_id, status="error", error=str(e))
+            await job_store.update(job_id, status="error", error=str(e))
             logger.error(f"Job {job_id} failed: {e}")
         finally:
-            job_queue.task_done()
+            _jobs_in_flight -= 1
+            await job_store.job_done(job_id)
+    logger.info(f"Job worker #{worker_index} stopped")
+
+# -----------------------------------------------------------------------------
+# Reusable yt-dlp instances
+# -----------------------------------------------------------------------------
+# YoutubeDL construction re-initialises extractors, postprocessors and the HTTP request
+# director; cookie-less downloads reuse idle instances keyed by (audio_format, bitrate),
+# the only options that vary between them apart from outtmpl. Each instance is used by
+# one worker thread at a time (it is out of the pool while in use).
+_ydl_pool: "dict[tuple[str, int], queue.SimpleQueue]" = {}
+
+
+def _acquire_ydl(key: tuple, ydl_opts: dict) -> yt_dlp.YoutubeDL:
+    pool = _ydl_pool.setdefault(key, queue.SimpleQueue())
+    try:
+        ydl = pool.get_nowait()
+    except queue.Empty:
+        return yt_dlp.YoutubeDL(ydl_opts)
+    # Only the per-job output template differs from the options the instance was built with
+    ydl.params["outtmpl"]["default"] = ydl_opts["outtmpl"]
+    return ydl
+
+
+def _release_ydl(key: tuple, ydl: yt_dlp.YoutubeDL):
+    _ydl_pool.setdefault(key, queue.SimpleQueue()).put(ydl)
+
 
 # Models
 class DownloadRequest(BaseModel):
@@ -138,7 +187,7 @@ def _map_quality(quality: str) -> int:
     if not quality:
         return 0
     quality = quality.lower()
-    mapping = settings.quality_bitrate_mapping
+    mapping = settings.QUALITY_BITRATES
     if quality in mapping:
         return mapping[quality]
     return 0  # fallback best
@@ -148,13 +197,12 @@ def _validate_url(url: str):
     if not url:
         raise HTTPException(status_code=400, detail="URL is required")
     # Domain restriction (optional)
-    if settings.allowed_domains_list:
-        import urllib.parse
+    if settings.ALLOWED_DOMAINS:
         try:
-            host = urllib.parse.urlparse(url).netloc.lower()
+            host = urlsplit(url).netloc.lower()
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid URL")
-        if not any(host.endswith(d) for d in settings.allowed_domains_list):
+        if not settings.is_domain_allowed(host):
             raise HTTPException(status_code=400, detail="URL domain not allowed")
 
 
@@ -163,12 +211,15 @@ def _target_dir() -> Path:
 
 
 def _is_allowed_format(fmt: str) -> bool:
-    return fmt.lower() in settings.allowed_formats_list
+    return fmt.lower() in settings.ALLOWED_FORMATS
 
 
-def _list_download_files() -> List[Path]:
-    target = _target_dir()
-    return [p for p in target.glob("*") if p.is_file()]
+def _iter_download_files() -> Iterator[os.DirEntry]:
+    # scandir gets the file type from readdir itself, so only the mtime needs a stat call
+    with os.scandir(settings.YT_DLP_OUTPUT_DIR) as it:
+        for entry in it:
+            if entry.is_file(follow_symlinks=False):
+                yield entry
 
 
 def _maybe_convert_json_cookies(cookies_content) -> str:
@@ -236,6 +287,47 @@ def _maybe_convert_json_cookies(cookies_content) -> str:
         return cookies_content if isinstance(cookies_content, str) else json.dumps(cookies_content)
 
 
+COOKIES_MAX_BYTES = 64 * 1024
+_COOKIES_READ_CHUNK = 8192
+
+
+async def _read_cookies_upload(cookies_file: UploadFile) -> str:
+    """
+    Read an uploaded cookies file in chunks, rejecting it (400) as soon as it exceeds
+    COOKIES_MAX_BYTES instead of buffering the whole upload first.
+    """
+    chunks = []
+    total = 0
+    while chunk := await cookies_file.read(_COOKIES_READ_CHUNK):
+        total += len(chunk)
+        if total > COOKIES_MAX_BYTES:
+            raise HTTPException(status_code=400, detail="Cookies file too large (>64KB)")
+        chunks.append(chunk)
+    return b"".join(chunks).decode("utf-8")
+
+
+def _write_cookies_file(path: Path, cookies_content) -> None:
+    """
+    Convert cookies to Netscape format when needed and write them for yt-dlp's cookiefile.
+    Blocking; callers run it via asyncio.to_thread.
+    """
+    processed_cookies = _maybe_convert_json_cookies(cookies_content)
+    line_count = processed_cookies.count("\n") if isinstance(processed_cookies, str) else "n/a"
+    logger.debug(f"_write_cookies_file: processed_cookies_type={type(processed_cookies).__name__} lines={line_count}")
+    if not isinstance(processed_cookies, str):
+        # Safety: ensure string before write
+        processed_cookies = json.dumps(processed_cookies)
+    # Owner-only (session credentials); O_CLOEXEC keeps the fd out of ffmpeg children
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o600)
+    with open(fd, "w", encoding="utf-8") as f:
+        f.write(processed_cookies)
+    # Log detection mode
+    if processed_cookies.startswith("# Netscape HTTP Cookie File"):
+        logger.info("Using provided cookies (JSON array converted to Netscape format)")
+    else:
+        logger.info("Using provided cookies (raw/other format)")
+
+
 # Cleanup task
 async def _cleanup_loop():
     interval = settings.CLEANUP_INTERVAL_SECONDS
@@ -244,37 +336,87 @@ async def _cleanup_loop():
         try:
             now = time.time()
             count_removed = 0
-            for file_path in _list_download_files():
+            for entry in _iter_download_files():
                 try:
-                    age = now - file_path.stat().st_mtime
+                    age = now - entry.stat(follow_symlinks=False).st_mtime
                 except FileNotFoundError:
                     continue
                     # Race condition benign
                 if age > max_age_seconds:
                     try:
-                        file_path.unlink(missing_ok=True)
+                        os.unlink(entry.path)
                         count_removed += 1
+                    except FileNotFoundError:
+                        pass
                     except Exception as e:
-                        logger.warning(f"Cleanup failed for {file_path}: {e}")
+                        logger.warning(f"Cleanup failed for {entry.path}: {e}")
             if count_removed:
                 logger.info(f"Cleanup removed {count_removed} expired files")
+            jobs_removed = await job_store.prune(now)
+            if jobs_removed:
+                logger.info(f"Cleanup evicted {jobs_removed} finished job records")
         except Exception as e:
             logger.error(f"Cleanup loop error: {e}")
         await asyncio.sleep(interval)
 
 
+async def _restart_on_failure(name: str, coro_fn):
+    # Keeps a crashed background loop from silently disappearing; a normal return ends it
+    while True:
+        try:
+            return await coro_fn()
+        except Exception:
+            logger.exception(f"{name} crashed; restarting in 1s")
+            await asyncio.sleep(1)
+
+
+async def _supervise_background_tasks():
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(_restart_on_failure("Cleanup loop", _cleanup_loop))
+        # Redis backend: heartbeat + requeue of jobs held by dead processes
+        tg.create_task(_restart_on_failure("Job store maintenance", job_store.maintain))
+        # Job workers (same as concurrency limit)
+        for i in range(settings.MAX_CONCURRENT_DOWNLOADS):
+            tg.create_task(_restart_on_failure(f"Job worker #{i + 1}", lambda n=i + 1: _job_worker(n)))
+
+
+_supervisor_task: Optional[asyncio.Task] = None
+
+
 @app.on_event("startup")
 async def startup_event():
-    # Ensure directory exists (already ensured in config but idempotent)
-    _target_dir().mkdir(parents=True, exist_ok=True)
-    # Launch cleanup background loop
-    asyncio.create_task(_cleanup_loop())
-    # Launch job workers (same as concurrency limit)
-    for i in range(settings.MAX_CONCURRENT_DOWNLOADS):
-        asyncio.create_task(_job_worker(i + 1))
+    global _supervisor_task
+    # Ensure output directory exists (done once here, not on every get_settings())
+    settings.ensure_directories()
+    _supervisor_task = asyncio.create_task(_supervise_background_tasks())
     logger.info("Startup complete – cleanup + job workers initiated.")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Stop idle workers at once (a job they pop from here on would only be cancelled at the
+    # deadline), let running jobs finish (bounded) so a restart doesn't leave half-written
+    # downloads, then cancel the rest. Jobs a cancelled pop had already claimed in Redis are
+    # handed back by job_store.close().
+    _shutdown_requested.set()
+    for task in list(_idle_workers):
+        task.cancel()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.JOB_DRAIN_TIMEOUT_SECONDS
+    if _jobs_in_flight:
+        logger.info(f"Shutdown: waiting up to {settings.JOB_DRAIN_TIMEOUT_SECONDS}s for {_jobs_in_flight} running job(s)")
+    while _jobs_in_flight and loop.time() < deadline:
+        await asyncio.sleep(0.2)
+    if _supervisor_task is not None:
+        _supervisor_task.cancel()
+        try:
+            await _supervisor_task
+        except asyncio.CancelledError:
+            pass
+    await _close_azure_client()
+    await job_store.close()
+
+
 # Unified endpoint (JSON or multipart form) – synchronous (waits for completion)
 @app.post("/download", response_model=DownloadResponse)
 async def download_audio(
@@ -310,22 +452,20 @@ async def download_audio(
             quality = settings.DEFAULT_AUDIO_QUALITY
         if cookies_file:
             # Limit file size (64KB)
-            content = await cookies_file.read()
-            if len(content) > 64 * 1024:
-                raise HTTPException(status_code=400, detail="Cookies file too large (>64KB)")
-            cookies_content = content.decode("utf-8")
+            cookies_content = await _read_cookies_upload(cookies_file)
             logger.info(f"Received cookies file upload: {cookies_file.filename}")
 
     _validate_url(url)
     format = format.lower()
     if not _is_allowed_format(format):
-        raise HTTPException(status_code=400, detail=f"Format not allowed. Allowed: {settings.allowed_formats_list}")
+        raise HTTPException(status_code=400, detail=f"Format not allowed. Allowed: {sorted(settings.ALLOWED_FORMATS)}")
 
     # Normalize quality
     quality = (quality or settings.DEFAULT_AUDIO_QUALITY).lower()
     bitrate = _map_quality(quality)
 
-    return await _perform_download(url=url, audio_format=format, quality_label=quality, bitrate=bitrate, cookies_content=cookies_content)
+    async with sync_download_semaphore:
+        return await _perform_download(url=url, audio_format=format, quality_label=quality, bitrate=bitrate, cookies_content=cookies_content)
 
 
 # -----------------------------------------------------------------------------
@@ -345,6 +485,32 @@ class AsyncJobStatusResponse(BaseModel):
     error: Optional[str] = None
 
 
+async def _enqueue_job(payload: dict, cookies_content=None) -> str:
+    """
+    Register and queue a job without waiting; 503 (with Retry-After) when the queue is full.
+    Cookies are written to <job_id>_cookies.txt right away so the queued payload only
+    carries the path, not the cookie text.
+    """
+    job_id = uuid.uuid4().hex
+    cookies_path = None
+    if cookies_content:
+        cookies_path = _target_dir() / f"{job_id}_cookies.txt"
+        await asyncio.to_thread(_write_cookies_file, cookies_path, cookies_content)
+        payload["cookies_path"] = str(cookies_path)
+    try:
+        await job_store.enqueue(job_id, payload)
+    except JobQueueFull:
+        if cookies_path:
+            cookies_path.unlink(missing_ok=True)
+        logger.warning(f"Job queue full ({JOB_QUEUE_MAXSIZE}); rejecting enqueue")
+        raise HTTPException(
+            status_code=503,
+            detail="Job queue is full, retry later",
+            headers={"Retry-After": "30"},
+        )
+    return job_id
+
+
 @app.post("/download/async", response_model=AsyncEnqueueResponse)
 async def enqueue_download(request: Request):
     """
@@ -386,59 +552,42 @@ async def enqueue_download(request: Request):
 
     _validate_url(url)
     if not _is_allowed_format(fmt):
-        raise HTTPException(status_code=400, detail=f"Format not allowed. Allowed: {settings.allowed_formats_list}")
+        raise HTTPException(status_code=400, detail=f"Format not allowed. Allowed: {sorted(settings.ALLOWED_FORMATS)}")
 
     bitrate = _map_quality(q)
-    job_id = uuid.uuid4().hex
-    payload = dict(url=url, format=fmt, quality_label=q, bitrate=bitrate, cookies=cookies_content)
-    _create_job_record(job_id, payload)
-    await job_queue.put((job_id, payload))
+    payload = dict(url=url, format=fmt, quality_label=q, bitrate=bitrate)
+    job_id = await _enqueue_job(payload, cookies_content)
     logger.info(f"Enqueued job {job_id} url={url}")
     return AsyncEnqueueResponse(job_id=job_id, status="pending")
 
 
+def _job_status_response(rec: dict) -> AsyncJobStatusResponse:
+    result_obj = rec.get("result")
+    if isinstance(result_obj, dict):
+        # Rehydrate DownloadResponse (Redis backend stores it as JSON)
+        result_obj = DownloadResponse.model_validate(result_obj)
+    return AsyncJobStatusResponse(
+        id=rec["id"],
+        status=rec["status"],
+        created_at=_iso_from_ns(rec["created_ns"]),
+        updated_at=_iso_from_ns(rec["updated_ns"]),
+        result=result_obj,
+        error=rec.get("error"),
+    )
+
+
 @app.get("/download/async/{job_id}", response_model=AsyncJobStatusResponse)
 async def get_job_status(job_id: str):
-    with _jobs_lock:
-        rec = _jobs.get(job_id)
-        if not rec:
-            raise HTTPException(status_code=404, detail="Job not found")
-        result_obj = None
-        if rec.get("result"):
-            # Rehydrate DownloadResponse
-            result_obj = DownloadResponse(**rec["result"])
-        return AsyncJobStatusResponse(
-            id=rec["id"],
-            status=rec["status"],
-            created_at=rec["created_at"],
-            updated_at=rec["updated_at"],
-            result=result_obj,
-            error=rec.get("error"),
-        )
+    rec = await job_store.get(job_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_status_response(rec)
 
 
 @app.get("/download/async", response_model=List[AsyncJobStatusResponse])
 async def list_jobs(limit: int = 50):
-    with _jobs_lock:
-        # Sort by created_at desc
-        items = list(_jobs.values())
-    items.sort(key=lambda r: r["created_at"], reverse=True)
-    result = []
-    for rec in items[:limit]:
-        result_obj = None
-        if rec.get("result"):
-            result_obj = DownloadResponse(**rec["result"])
-        result.append(
-            AsyncJobStatusResponse(
-                id=rec["id"],
-                status=rec["status"],
-                created_at=rec["created_at"],
-                updated_at=rec["updated_at"],
-                result=result_obj,
-                error=rec.get("error"),
-            )
-        )
-    return result
+    # Newest first; only `limit` records are fetched
+    return [_job_status_response(rec) for rec in await job_store.recent(limit)]
 
 
 @app.post("/download/async/form", response_model=AsyncEnqueueResponse)
@@ -464,28 +613,30 @@ async def enqueue_download_form(
     q = (quality or settings.DEFAULT_AUDIO_QUALITY).lower()
 
     if cookies_file:
-        content = await cookies_file.read()
-        if len(content) > 64 * 1024:
-            raise HTTPException(status_code=400, detail="Cookies file too large (>64KB)")
-        cookies_content = content.decode("utf-8")
+        cookies_content = await _read_cookies_upload(cookies_file)
         logger.info(f"Received cookies file upload (async form): {cookies_file.filename}")
     else:
         cookies_content = None
 
     _validate_url(url)
     if not _is_allowed_format(fmt):
-        raise HTTPException(status_code=400, detail=f"Format not allowed. Allowed: {settings.allowed_formats_list}")
+        raise HTTPException(status_code=400, detail=f"Format not allowed. Allowed: {sorted(settings.ALLOWED_FORMATS)}")
 
     bitrate = _map_quality(q)
-    job_id = uuid.uuid4().hex
-    payload = dict(url=url, format=fmt, quality_label=q, bitrate=bitrate, cookies=cookies_content)
-    _create_job_record(job_id, payload)
-    await job_queue.put((job_id, payload))
+    payload = dict(url=url, format=fmt, quality_label=q, bitrate=bitrate)
+    job_id = await _enqueue_job(payload, cookies_content)
     logger.info(f"Enqueued (form) job {job_id} url={url}")
     return AsyncEnqueueResponse(job_id=job_id, status="pending")
 
 
-async def _perform_download(url: str, audio_format: str, quality_label: str, bitrate: int, cookies_content: Optional[str]):
+async def _perform_download(
+    url: str,
+    audio_format: str,
+    quality_label: str,
+    bitrate: int,
+    cookies_content: Optional[str],
+    cookies_file_path: Optional[Path] = None,
+):
     unique_id = str(uuid.uuid4())
     out_template = str(_target_dir() / f"{unique_id}.%(ext)s")
     logger.debug(f"_perform_download: start url={url} cookies_type={type(cookies_content).__name__ if cookies_content is not None else 'None'}")
@@ -509,50 +660,54 @@ async def _perform_download(url: str, audio_format: str, quality_label: str, bit
         "postprocessors": postprocessors,
     }
 
-    cookies_file_path = None
+    # cookies_file_path: already written by _enqueue_job; removed below either way
     if cookies_content:
-        processed_cookies = _maybe_convert_json_cookies(cookies_content)
-        logger.debug(f"_perform_download: processed_cookies_type={type(processed_cookies).__name__} lines={processed_cookies.count('\\n') if isinstance(processed_cookies,str) else 'n/a'}")
         cookies_file_path = _target_dir() / f"{unique_id}_cookies.txt"
-        if not isinstance(processed_cookies, str):
-            # Safety: ensure string before write
-            processed_cookies = json.dumps(processed_cookies)
-        cookies_file_path.write_text(processed_cookies, encoding="utf-8")
+        await asyncio.to_thread(_write_cookies_file, cookies_file_path, cookies_content)
+    if cookies_file_path:
         ydl_opts["cookiefile"] = str(cookies_file_path)
-        # Log detection mode
-        if isinstance(processed_cookies, str) and processed_cookies.startswith("# Netscape HTTP Cookie File"):
-            logger.info("Using provided cookies (JSON array converted to Netscape format)")
-        else:
-            logger.info("Using provided cookies (raw/other format)")
 
-    async with download_semaphore:
-        try:
-            def blocking_download():
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    ydl.download([url])
-                    return info
-
-            info = await asyncio.to_thread(blocking_download)
-        except yt_dlp.utils.DownloadError as e:
-            logger.error(f"yt-dlp download error: {e}")
-            raise HTTPException(status_code=500, detail=f"Download failed: {e}") from e
-        except Exception as e:
-            logger.error(f"Unexpected download error: {e}")
-            raise HTTPException(status_code=500, detail="Internal download error") from e
-        finally:
-            if cookies_file_path and cookies_file_path.exists():
-                try:
-                    cookies_file_path.unlink()
-                except Exception as e:
-                    logger.warning(f"Failed cleanup cookies file: {e}")
-
-    # Locate the produced audio file (match allowed formats)
-    downloaded_file = None
-    for path in _target_dir().glob(f"{unique_id}.*"):
-        if path.suffix.lower().lstrip(".") in settings.allowed_formats_list:
-            downloaded_file = path
-            break
+    pool_key = (audio_format, bitrate)
+    try:
+        def blocking_download():
+            # User-supplied cookies get a dedicated instance so they never enter the shared pool
+            pooled = cookies_file_path is None
+            ydl = _acquire_ydl(pool_key, ydl_opts) if pooled else yt_dlp.YoutubeDL(ydl_opts)
+            succeeded = False
+            try:
+                # Single extraction pass: download=True fetches metadata and media together
+                info = ydl.extract_info(url, download=True)
+                succeeded = True
+                return info
+            finally:
+                if pooled and succeeded:
+                    _release_ydl(pool_key, ydl)
+                else:
+                    ydl.close()
+
+        info = await asyncio.to_thread(blocking_download)
+    except yt_dlp.utils.DownloadError as e:
+        logger.error(f"yt-dlp download error: {e}")
+        raise HTTPException(status_code=500, detail=f"Download failed: {e}") from e
+    except Exception as e:
+        logger.error(f"Unexpected download error: {e}")
+        raise HTTPException(status_code=500, detail="Internal download error") from e
+    finally:
+        if cookies_file_path and cookies_file_path.exists():
+            try:
+                cookies_file_path.unlink()
+            except Exception as e:
+                logger.warning(f"Failed cleanup cookies file: {e}")
+
+    # Locate the produced audio file. FFmpegExtractAudio writes <id>.<audio_format>, so one
+    # stat normally suffices; scan the directory only if another allowed extension was produced.
+    downloaded_file = _target_dir() / f"{unique_id}.{audio_format}"
+    if not downloaded_file.is_file():
+        downloaded_file = None
+        for path in _target_dir().glob(f"{unique_id}.*"):
+            if path.suffix.lower().lstrip(".") in settings.ALLOWED_FORMATS:
+                downloaded_file = path
+                break
 
     if not downloaded_file or not downloaded_file.exists():
         raise HTTPException(status_code=500, detail="Download failed – output file not found")
@@ -605,6 +760,79 @@ async def _perform_download(url: str, audio_format: str, quality_label: str, bit
     )
 
 
+# Client-level transfer tuning: anything above 4 MiB is split into 4 MiB blocks that are
+# uploaded concurrently (SDK default is a single PUT for blobs up to 64 MiB).
+_AZURE_TRANSFER_OPTIONS = {
+    "max_single_put_size": 4 * 1024 * 1024,
+    "max_block_size": 4 * 1024 * 1024,
+}
+
+
+# Process-wide Azure client (reuses its HTTP connection pool / TLS sessions across uploads)
+_azure_bsc = None
+_azure_container_ensured = False
+
+
+def _get_azure_client():
+    global _azure_bsc
+    if _azure_bsc is None:
+        # Instantiate BlobServiceClient according to credential mode
+        if settings.azure_uses_connection_string:
+            _azure_bsc = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING, **_AZURE_TRANSFER_OPTIONS)
+        elif settings.azure_uses_sas:
+            _azure_bsc = BlobServiceClient(account_url=settings.AZURE_BLOB_ACCOUNT_URL, credential=settings.azure_sas_token_clean, **_AZURE_TRANSFER_OPTIONS)
+        else:
+            raise RuntimeError("Azure not properly configured (no connection string or SAS token)")
+    return _azure_bsc
+
+
+async def _ensure_azure_container(container_client):
+    """
+    Create the target container once per process; later uploads skip the round trip.
+    """
+    global _azure_container_ensured
+    if _azure_container_ensured:
+        return
+    try:
+        await container_client.create_container()
+    except ResourceExistsError:
+        pass
+    except Exception as e:
+        # e.g. SAS without create permission – upload may still succeed; retry next time
+        logger.debug(f"create_container skipped: {e}")
+        return
+    _azure_container_ensured = True
+
+
+async def _close_azure_client():
+    global _azure_bsc
+    if _azure_bsc is not None:
+        await _azure_bsc.close()
+        _azure_bsc = None
+
+
+def _drop_page_cache(fd: int) -> None:
+    # Advisory: the uploaded file is not read again soon, so don't let it evict hotter pages
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+
+class _AsyncFileReader:
+    """
+    Minimal async stream for the aio blob SDK: each read() runs in a worker thread, so
+    disk I/O never blocks the event loop (the SDK awaits read() results that are awaitable).
+    """
+
+    def __init__(self, f):
+        self._f = f
+
+    async def read(self, size: int = -1) -> bytes:
+        return await asyncio.to_thread(self._f.read, size)
+
+
 async def _upload_to_azure(local_path: Path, logical_name: str):
     """
     Upload the file at local_path to Azure Blob Storage if configured.
@@ -622,55 +850,61 @@ async def _upload_to_azure(local_path: Path, logical_name: str):
     else:
         blob_name = logical_name
 
-    # Use thread offloading for blocking SDK calls
-    def _blocking():
-        # Instantiate BlobServiceClient according to credential mode
-        if settings.azure_uses_connection_string:
-            bsc = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING)
-        elif settings.azure_uses_sas:
-            bsc = BlobServiceClient(account_url=settings.AZURE_BLOB_ACCOUNT_URL, credential=settings.azure_sas_token_clean)
-        else:
-            raise RuntimeError("Azure not properly configured (no connection string or SAS token)")
-
-        container_client = bsc.get_container_client(settings.AZURE_BLOB_CONTAINER_NAME)
-        try:
-            container_client.create_container()
-        except Exception:
-            pass  # Already exists or race
-
-        blob_client = container_client.get_blob_client(blob_name)
-
-        # Upload (overwrite behavior)
-        with open(local_path, "rb") as f:
-            blob_client.upload_blob(f, overwrite=True)
-
-        blob_url = blob_client.url
-        sas_url = None
+    bsc = _get_azure_client()
+    container_client = bsc.get_container_client(settings.AZURE_BLOB_CONTAINER_NAME)
+    await _ensure_azure_container(container_client)
+    blob_client = container_client.get_blob_client(blob_name)
+
+    # Upload (overwrite behavior) as parallel block PUTs; file reads run off the event loop
+    with open(local_path, "rb") as f:
+        await blob_client.upload_blob(
+            _AsyncFileReader(f),
+            length=os.fstat(f.fileno()).st_size,
+            overwrite=True,
+            blob_type=BlobType.BlockBlob,
+            max_concurrency=settings.AZURE_UPLOAD_CONCURRENCY,
+        )
+        _drop_page_cache(f.fileno())
+
+    blob_url = blob_client.url
+    sas_url = None
+
+    # Only attempt SAS generation if using connection string (need account key)
+    if settings.azure_uses_connection_string:
+        if settings.AZURE_GENERATE_SAS and generate_blob_sas and BlobSasPermissions:
+            try:
+                perms = BlobSasPermissions.from_string(settings.AZURE_SAS_PERMISSIONS)
+                expiry = datetime.utcnow() + timedelta(seconds=settings.AZURE_SAS_EXPIRY_SECONDS)
+                sas_token = generate_blob_sas(
+                    account_name=bsc.account_name,
+                    container_name=settings.AZURE_BLOB_CONTAINER_NAME,
+                    blob_name=blob_name,
+                    account_key=bsc.credential.account_key,
+                    permission=perms,
+                    expiry=expiry,
+                )
+                sas_url = f"{blob_url}?{sas_token}"
+            except Exception as e:
+                logging.getLogger("yt-dlp-server").warning(f"Failed to generate SAS: {e}")
+    else:
+        # If user requested SAS generation but only supplied a pre-generated SAS token, warn once.
+        if settings.AZURE_GENERATE_SAS:
+            logging.getLogger("yt-dlp-server").warning("AZURE_GENERATE_SAS ignored when using pre-generated SAS credentials (provide connection string for dynamic SAS).")
 
-        # Only attempt SAS generation if using connection string (need account key)
-        if settings.azure_uses_connection_string:
-            if settings.AZURE_GENERATE_SAS and generate_blob_sas and BlobSasPermissions:
-                try:
-                    perms = BlobSasPermissions.from_string(settings.AZURE_SAS_PERMISSIONS)
-                    expiry = datetime.utcnow() + timedelta(seconds=settings.AZURE_SAS_EXPIRY_SECONDS)
-                    sas_token = generate_blob_sas(
-                        account_name=bsc.account_name,
-                        container_name=settings.AZURE_BLOB_CONTAINER_NAME,
-                        blob_name=blob_name,
-                        permission=perms,
-                        expiry=expiry,
-                    )
-                    sas_url = f"{blob_url}?{sas_token}"
-                except Exception as e:
-                    logging.getLogger("yt-dlp-server").warning(f"Failed to generate SAS: {e}")
-        else:
-            # If user requested SAS generation but only supplied a pre-generated SAS token, warn once.
-            if settings.AZURE_GENERATE_SAS:
-                logging.getLogger("yt-dlp-server").warning("AZURE_GENERATE_SAS ignored when using pre-generated SAS credentials (provide connection string for dynamic SAS).")
+    return blob_url, sas_url
 
-        return blob_url, sas_url
 
-    return await asyncio.to_thread(_blocking)
+# Content-Type per produced extension (yt-dlp audio postprocessor outputs)
+_AUDIO_MEDIA_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".webm": "audio/webm",
+    ".flac": "audio/flac",
+    ".wav": "audio/wav",
+}
 
 
 @app.get("/download/{filename}")
@@ -679,9 +913,10 @@ async def get_file(filename: str):
     if not _is_valid_uuid_prefix(filename):
         raise HTTPException(status_code=400, detail="Invalid filename pattern")
     file_path = _target_dir() / filename
-    if not file_path.exists():
+    if not file_path.is_file():
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(path=file_path, media_type="audio/mpeg", filename=filename)
+    media_type = _AUDIO_MEDIA_TYPES.get(file_path.suffix.lower(), "application/octet-stream")
+    return FileResponse(path=file_path, media_type=media_type, filename=filename)
 
 
 @app.delete("/download/{filename}")
@@ -698,13 +933,13 @@ async def delete_file(filename: str):
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {e}")
 
 
+# Hyphenated (download files) or bare hex (job ids). fullmatch on the stem keeps names
+# like <uuid>_cookies.txt unservable.
+_UUID_RE = re.compile(r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}")
+
+
 def _is_valid_uuid_prefix(name: str) -> bool:
-    try:
-        stem = name.split(".", 1)[0]
-        uuid.UUID(stem)
-        return True
-    except Exception:
-        return False
+    return _UUID_RE.fullmatch(name.split(".", 1)[0]) is not None
 
 
 @app.get("/health")
@@ -722,8 +957,8 @@ async def readiness():
       - Directory existence & write test
       - Free disk space check
     """
+    settings.ensure_directories()
     target = _target_dir()
-    target.mkdir(parents=True, exist_ok=True)
     # Disk space
     usage = shutil.disk_usage(target)
     free_mb = usage.free / (1024 * 1024)
@@ -744,10 +979,19 @@ async def readiness():
         "min_required_mb": settings.MIN_FREE_DISK_MB,
         "output_dir": str(target),
         "concurrency_limit": settings.MAX_CONCURRENT_DOWNLOADS,
+        "sync_concurrency_limit": settings.MAX_CONCURRENT_SYNC_DOWNLOADS,
     }
 
 
 if __name__ == "__main__":
     # Allow running standalone: python -m app.main
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8080)
+
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    if workers > 1 and settings.JOB_BACKEND != "redis":
+        # In-memory job queue and registry live in this process: a job enqueued via one worker
+        # would be invisible to status polls answered by another (use JOB_BACKEND=redis)
+        logger.warning(f"WEB_CONCURRENCY={workers} ignored: in-process job registry requires a single worker")
+        workers = 1
+    # uvloop event loop + httptools parser (both shipped with uvicorn[standard])
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8080, loop="uvloop", http="httptools", workers=workers)
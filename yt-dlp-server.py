@@ -4,17 +4,27 @@ yt-dlp API Server for n8n integration
 Provides a REST API to download YouTube audio using yt-dlp
 """
 
+import base64
+import errno
+import fcntl
+import io
 import os
+import mimetypes
+import shutil
+import stat
 import tempfile
+import threading
+import time
 import asyncio
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
 from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Request
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel, HttpUrl
 from typing import Optional, Union
 import yt_dlp
+from yt_dlp.cookies import YoutubeDLCookieJar
 import uvicorn
-from pathlib import Path
-import uuid
 import logging
 
 # Configure logging
@@ -27,7 +37,7 @@ class DownloadRequest(BaseModel):
     url: HttpUrl
     format: str = "mp3"
     quality: str = "best"
-    cookies: str = None  # Optional cookies parameter - treats as cookie string content
+    cookies: Optional[str] = None  # Optional cookies parameter - treats as cookie string content
 
 class DownloadResponse(BaseModel):
     success: bool
@@ -36,71 +46,319 @@ class DownloadResponse(BaseModel):
     duration: float
     title: str
 
-# Create temporary directory for downloads
-TEMP_DIR = Path(tempfile.gettempdir()) / "yt-dlp-downloads"
-TEMP_DIR.mkdir(exist_ok=True)
+# Create temporary directory for downloads (a plain str: joined and stat'ed on every request)
+TEMP_DIR = os.path.join(tempfile.gettempdir(), "yt-dlp-downloads")
+os.makedirs(TEMP_DIR, exist_ok=True)
+
+# Files (downloads and leftover cookies/.part files) older than this are removed by the
+# background sweeper
+MAX_FILE_AGE_HOURS = float(os.environ.get("MAX_FILE_AGE_HOURS", "6"))
+CLEANUP_INTERVAL_SECONDS = int(os.environ.get("CLEANUP_INTERVAL_SECONDS", "600"))
+
+# Downloads run in worker threads; cap how many run at once (file descriptors, ffmpeg
+# processes and YouTube rate limits). The cap is server-wide: uvicorn worker processes each
+# gate their own downloads with download_semaphore, then take one of the shared slot locks.
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get("MAX_CONCURRENT_DOWNLOADS", "3"))
+download_semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+
+# Slot lock files live outside TEMP_DIR so the sweeper never unlinks one while it is held
+DOWNLOAD_LOCK_DIR = os.path.join(tempfile.gettempdir(), "yt-dlp-locks")
+os.makedirs(DOWNLOAD_LOCK_DIR, exist_ok=True)
+_SLOT_POLL_SECONDS = 0.25
+
+def _try_lock_slot() -> Optional[int]:
+    """Non-blocking flock on the first free slot file; returns its fd (close to release)"""
+    for i in range(MAX_CONCURRENT_DOWNLOADS):
+        # A fresh open file description per attempt: flock is per description, so a shared
+        # fd would let two coroutines of one process hold the same slot
+        fd = os.open(os.path.join(DOWNLOAD_LOCK_DIR, f"slot-{i}.lock"), os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+    return None
+
+async def _acquire_download_slot() -> int:
+    # Locks held by other workers are only observable by polling; released on close or exit
+    while (fd := _try_lock_slot()) is None:
+        await asyncio.sleep(_SLOT_POLL_SECONDS)
+    return fd
+
+# Reusable yt-dlp instances: construction re-initialises extractors, postprocessors and the
+# HTTP request director, so cookie-less downloads reuse idle instances keyed by format (the
+# only option that varies apart from outtmpl). format is not validated here, so at most
+# YDL_POOL_MAX_KEYS formats are kept (least recently used evicted and closed).
+YDL_POOL_MAX_KEYS = 8
+_ydl_pool: "OrderedDict[str, list]" = OrderedDict()
+_ydl_pool_lock = threading.Lock()
+
+def _new_file_id() -> str:
+    """Time-ordered 22-char ID: a UUIDv7 (RFC 9562) in unpadded URL-safe base64
+
+    The 48-bit millisecond timestamp leads, so files created close together share a name
+    prefix instead of being scattered like uuid4 names; 22 chars instead of 36 also means
+    less string work in paths and outtmpl.
+    """
+    ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), 'big')  # 74 of the 80 bits are used
+    value = (
+        (ms & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76                          # version 7
+        | (rand >> 68) << 64                 # rand_a, 12 bits
+        | 0b10 << 62                         # RFC variant
+        | rand & 0x3FFF_FFFF_FFFF_FFFF       # rand_b, 62 bits
+    )
+    return base64.urlsafe_b64encode(value.to_bytes(16, 'big')).rstrip(b'=').decode('ascii')
+
+def _acquire_ydl(key: str, ydl_opts: dict) -> yt_dlp.YoutubeDL:
+    with _ydl_pool_lock:
+        idle = _ydl_pool.get(key)
+        ydl = idle.pop() if idle else None
+    if ydl is None:
+        return yt_dlp.YoutubeDL(ydl_opts)
+    # Only the per-request output template differs from the options the instance was built with
+    ydl.params['outtmpl']['default'] = ydl_opts['outtmpl']
+    return ydl
+
+def _release_ydl(key: str, ydl: yt_dlp.YoutubeDL):
+    evicted = []
+    with _ydl_pool_lock:
+        _ydl_pool.setdefault(key, []).append(ydl)
+        _ydl_pool.move_to_end(key)
+        while len(_ydl_pool) > YDL_POOL_MAX_KEYS:
+            evicted.extend(_ydl_pool.popitem(last=False)[1])
+    for stale in evicted:
+        stale.close()
 
 @app.post("/download", response_model=DownloadResponse)
-async def download_audio(
-    request: Request,
-    # JSON request parameters
-    url: Optional[str] = Form(None),
-    format: Optional[str] = Form("mp3"),
-    quality: Optional[str] = Form("best"),
+async def download_audio(req: DownloadRequest):
+    """Download YouTube audio and return file information (JSON body, cookies as string)"""
+    cookiejar = _load_cookiejar(io.StringIO(req.cookies)) if req.cookies else None
+    return await _download_audio_logic(
+        url=str(req.url),
+        format=req.format,
+        quality=req.quality,
+        cookiejar=cookiejar
+    )
+
+@app.post("/download/form", response_model=DownloadResponse)
+async def download_audio_form(
+    url: str = Form(...),
+    format: str = Form("mp3"),
+    quality: str = Form("best"),
     cookies_file: Optional[UploadFile] = File(None)
 ):
-    """Download YouTube audio and return file information
+    """Download YouTube audio and return file information (multipart form, optional cookies_file upload)"""
+    cookiejar = None
+    if cookies_file:
+        # Parse the spooled upload line by line, off the event loop
+        cookiejar = await asyncio.to_thread(_load_cookiejar_upload, cookies_file.file)
+        logger.info(f"Received uploaded cookies file: {cookies_file.filename}")
     
-    Supports both JSON requests and form data with file uploads:
-    - JSON: Send DownloadRequest with cookies as string
-    - Form data: Send form fields with optional cookies_file upload
+    return await _download_audio_logic(
+        url=url,
+        format=format,
+        quality=quality,
+        cookiejar=cookiejar
+    )
+
+def _load_cookiejar(text_stream) -> YoutubeDLCookieJar:
+    """Netscape cookies from a text stream into an in-memory jar (no temp file)"""
+    jar = YoutubeDLCookieJar()
+    try:
+        jar.load(text_stream)
+    except Exception as e:
+        logger.warning(f"Rejected cookies: {e}")
+        raise HTTPException(status_code=400, detail="Invalid cookies: expected Netscape cookies.txt format")
+    return jar
+
+def _load_cookiejar_upload(binary_file) -> YoutubeDLCookieJar:
+    wrapper = io.TextIOWrapper(binary_file, encoding='utf-8')
+    try:
+        return _load_cookiejar(wrapper)
+    finally:
+        wrapper.detach()  # Leave the upload's file open; Starlette closes it
+
+# Metadata cache: sanitized extract_info results of cookie-less requests by URL, so a repeat
+# download skips the webpage/player fetches. Entries live well inside the lifetime of the
+# signed media URLs they contain; a download that fails from a cached entry re-extracts.
+INFO_CACHE_TTL_SECONDS = int(os.environ.get("INFO_CACHE_TTL_SECONDS", "3600"))
+INFO_CACHE_MAX_ENTRIES = 128
+# Large and unused for audio extraction
+_INFO_CACHE_DROP_KEYS = ('automatic_captions', 'subtitles')
+_info_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_info_cache_lock = threading.Lock()
+
+def _info_cache_get(url: str) -> Optional[dict]:
+    with _info_cache_lock:
+        entry = _info_cache.get(url)
+        if entry is None:
+            return None
+        expires, info = entry
+        if expires < time.monotonic():
+            del _info_cache[url]
+            return None
+        _info_cache.move_to_end(url)
+        return info
+
+def _info_cache_put(url: str, info: dict):
+    if INFO_CACHE_TTL_SECONDS <= 0:
+        return
+    for key in _INFO_CACHE_DROP_KEYS:
+        info.pop(key, None)
+    with _info_cache_lock:
+        _info_cache[url] = (time.monotonic() + INFO_CACHE_TTL_SECONDS, info)
+        _info_cache.move_to_end(url)
+        while len(_info_cache) > INFO_CACHE_MAX_ENTRIES:
+            _info_cache.popitem(last=False)
+
+def _info_cache_discard(url: str):
+    with _info_cache_lock:
+        _info_cache.pop(url, None)
+
+def _run_ydl(ydl_opts: dict, url: str, cookiejar: Optional[YoutubeDLCookieJar] = None):
+    """Blocking yt-dlp extraction + download; returns (title, duration, filepath)
+
+    filepath is the final file reported by yt-dlp after postprocessing, or the outtmpl path
+    with the requested audio format's extension when yt-dlp doesn't report one.
     """
-    
-    # Check content type to determine request format
-    content_type = request.headers.get("content-type", "")
-    
-    if "application/json" in content_type:
-        # Handle JSON request
-        body = await request.body()
-        import json
-        try:
-            json_data = json.loads(body)
-            return await _download_audio_logic(
-                url=json_data.get("url"),
-                format=json_data.get("format", "mp3"),
-                quality=json_data.get("quality", "best"),
-                cookies_content=json_data.get("cookies")
-            )
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=400, detail="Invalid JSON")
+    # User-supplied cookies get a dedicated instance so they never enter the shared pool
+    pooled = cookiejar is None
+    key = ydl_opts['audioformat']
+    if pooled:
+        ydl = _acquire_ydl(key, ydl_opts)
     else:
-        # Handle form data request
-        if not url:
-            raise HTTPException(status_code=400, detail="URL is required")
-            
-        cookies_content = None
-        if cookies_file:
-            # Read the uploaded cookies file content
-            cookies_content = (await cookies_file.read()).decode('utf-8')
-            logger.info(f"Received uploaded cookies file: {cookies_file.filename}")
-        
-        return await _download_audio_logic(
-            url=url,
-            format=format,
-            quality=quality,
-            cookies_content=cookies_content
-        )
+        ydl = yt_dlp.YoutubeDL(ydl_opts)
+        # Replaces the lazily loaded (cookiefile-based) jar before any request is made
+        ydl.cookiejar = cookiejar
+    succeeded = False
+    try:
+        # Cookie-bound extractions may be private: never served from or stored in the cache
+        cached = _info_cache_get(url) if pooled else None
+        info = None
+        if cached is not None:
+            try:
+                # Processing mutates the info dict; sanitize_info hands it a fresh copy
+                info = ydl.process_ie_result(ydl.sanitize_info(cached, remove_private_keys=True), download=True)
+            except yt_dlp.utils.DownloadError as e:
+                logger.warning(f"Download from cached info failed, re-extracting: {e}")
+                _info_cache_discard(url)
+                info = None
+        if info is None:
+            # Single extraction pass: download=True fetches metadata and media together
+            info = ydl.extract_info(url, download=True)
+            if pooled:
+                _info_cache_put(url, ydl.sanitize_info(info, remove_private_keys=True))
+        title = info.get('title', 'Unknown')
+        duration = info.get('duration', 0)
+        requested = info.get('requested_downloads') or [{}]
+        filepath = requested[0].get('filepath') or ydl_opts['outtmpl'] % {'ext': ydl_opts['audioformat']}
+        succeeded = True
+        return title, duration, filepath
+    finally:
+        if pooled and succeeded:
+            _release_ydl(key, ydl)
+        else:
+            ydl.close()
+
+def _run_ydl_in_slot(slot_fd: int, ydl_opts: dict, url: str, cookiejar: Optional[YoutubeDLCookieJar]):
+    # The thread owns the slot: cancelling the awaiting request doesn't stop the download,
+    # so releasing it there would let another download start past the server-wide cap
+    try:
+        return _run_ydl(ydl_opts, url, cookiejar)
+    finally:
+        os.close(slot_fd)
+
+async def _run_ydl_limited(ydl_opts: dict, url: str, cookiejar: Optional[YoutubeDLCookieJar] = None):
+    async with download_semaphore:
+        slot_fd = await _acquire_download_slot()
+        # No await between acquiring and handing off: to_thread submits the call immediately
+        return await asyncio.to_thread(_run_ydl_in_slot, slot_fd, ydl_opts, url, cookiejar)
 
-async def _download_audio_logic(url: str, format: str, quality: str, cookies_content: Optional[str] = None):
+# Single-flight: concurrent cookie-less requests for the same (url, format) share one download
+_inflight: "dict[tuple, asyncio.Future]" = {}
+# os.link failures meaning "no hard link here" rather than a missing/unreadable source
+_NO_HARDLINK_ERRNOS = frozenset({errno.EXDEV, errno.EPERM, errno.EMLINK})
+
+class _LeaderCancelled(Exception):
+    """Set on the shared future when the leading request is cancelled (client went away)"""
+
+async def _download_shared(url: str, format: str, ydl_opts: dict, unique_id: str):
+    """_run_ydl_limited, joining an identical download already in progress
+
+    Joiners get their own hard link to the produced file, so one client's DELETE can't
+    remove another client's file. If the leader is cancelled, its joiners start over, the
+    first of them becoming the new leader.
+    """
+    key = (url, format)
+    while True:
+        leader = _inflight.get(key)
+        if leader is None:
+            fut = asyncio.get_running_loop().create_future()
+            _inflight[key] = fut
+            try:
+                result = await _run_ydl_limited(ydl_opts, url)
+            except asyncio.CancelledError:
+                # Joiners were not cancelled themselves; a plain exception lets them retry
+                fut.set_exception(_LeaderCancelled())
+                fut.exception()
+                raise
+            except Exception as e:
+                fut.set_exception(e)
+                fut.exception()  # Mark retrieved: joiners re-raise it, none is fine too
+                raise
+            finally:
+                del _inflight[key]
+            fut.set_result(result)
+            return result
+        try:
+            title, duration, filepath = await asyncio.shield(leader)
+            break
+        except _LeaderCancelled:
+            continue
+
+    own_path = os.path.join(TEMP_DIR, unique_id + os.path.splitext(filepath)[1])
+    try:
+        await asyncio.to_thread(os.link, filepath, own_path)
+    except OSError as e:
+        if e.errno not in _NO_HARDLINK_ERRNOS:
+            raise
+        # Cross-device or filesystem without hard links
+        await asyncio.to_thread(shutil.copyfile, filepath, own_path)
+    logger.info(f"Joined in-flight download for {url}")
+    return title, duration, own_path
+
+# FFmpegExtractAudio stream-copies (no decode/encode) when the downloaded audio is already in
+# the requested codec, so prefer such a source where YouTube offers one; otherwise fall back
+# to the best audio and transcode
+_COPYABLE_SOURCE_FORMATS = {
+    'm4a': 'bestaudio[acodec^=mp4a]',
+    'aac': 'bestaudio[acodec^=mp4a]',
+    'opus': 'bestaudio[acodec=opus]',
+    'vorbis': 'bestaudio[acodec=vorbis]',
+    'mp3': 'bestaudio[acodec=mp3]',
+}
+
+def _format_selector(format: str) -> str:
+    preferred = _COPYABLE_SOURCE_FORMATS.get(format)
+    return f"{preferred}/bestaudio/best" if preferred else 'bestaudio/best'
+
+async def _download_audio_logic(
+    url: str,
+    format: str,
+    quality: str,
+    cookiejar: Optional[YoutubeDLCookieJar] = None,
+):
     """Common download logic for both endpoints"""
     try:
         # Generate unique filename
-        unique_id = str(uuid.uuid4())
-        output_template = str(TEMP_DIR / f"{unique_id}.%(ext)s")
+        unique_id = _new_file_id()
+        output_template = os.path.join(TEMP_DIR, f"{unique_id}.%(ext)s")
         
         # Configure yt-dlp options
         ydl_opts = {
-            'format': 'bestaudio/best',
+            'format': _format_selector(format),
             'outtmpl': output_template,
             'extractaudio': True,
             'audioformat': format,
@@ -112,52 +370,33 @@ async def _download_audio_logic(url: str, format: str, quality: str, cookies_con
             }],
             'quiet': True,
             'no_warnings': True,
+            # Transfer tuning: parallel fragments (DASH/HLS), 10 MiB ranged requests for
+            # progressive media (avoids YouTube's per-connection throttling), bounded stalls
+            'concurrent_fragment_downloads': 8,
+            'http_chunk_size': 10 * 1024 * 1024,
+            'socket_timeout': 15,
+            'retries': 3,
         }
         
-        # Add cookies if provided
-        cookies_file_path = None
-        if cookies_content:
-            # Save cookies content to a temporary file
-            cookies_file_path = TEMP_DIR / f"{unique_id}_cookies.txt"
-            with open(cookies_file_path, 'w') as f:
-                f.write(cookies_content)
-            ydl_opts['cookiefile'] = str(cookies_file_path)
+        # Download the audio off the event loop
+        if cookiejar is not None:
             logger.info("Using uploaded/provided cookies")
+            title, duration, filepath = await _run_ydl_limited(ydl_opts, url, cookiejar)
+        else:
+            title, duration, filepath = await _download_shared(url, format, ydl_opts, unique_id)
         
-        # Download the audio
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Extract info first
-            info = ydl.extract_info(url, download=False)
-            title = info.get('title', 'Unknown')
-            duration = info.get('duration', 0)
-            
-            # Download the audio
-            ydl.download([url])
+        # The downloaded file: yt-dlp reports the post-processed path, so no directory scan
+        downloaded_file = filepath
         
-        # Find the downloaded file
-        downloaded_file = None
-        for file_path in TEMP_DIR.glob(f"{unique_id}.*"):
-            if file_path.suffix.lower() in ['.mp3', '.m4a', '.wav', '.ogg']:
-                downloaded_file = file_path
-                break
-        
-        if not downloaded_file or not downloaded_file.exists():
+        try:
+            st = os.stat(downloaded_file)
+        except FileNotFoundError:
             raise HTTPException(status_code=500, detail="Download failed - file not found")
         
-        file_size = downloaded_file.stat().st_size
-        
-        # Clean up temporary cookie file
-        if cookies_file_path and cookies_file_path.exists():
-            try:
-                cookies_file_path.unlink()
-                logger.info("Cleaned up temporary cookies file")
-            except Exception as e:
-                logger.warning(f"Failed to clean up cookies file: {e}")
-        
         return DownloadResponse(
             success=True,
-            filename=downloaded_file.name,
-            file_size=file_size,
+            filename=os.path.basename(downloaded_file),
+            file_size=st.st_size,
             duration=duration,
             title=title
         )
@@ -166,38 +405,129 @@ async def _download_audio_logic(url: str, format: str, quality: str, cookies_con
         logger.error(f"Download error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
 
+class AudioFileResponse(FileResponse):
+    """FileResponse streaming in 1 MiB chunks (Starlette default 64 KiB)
+
+    Starlette hands the path to the server for zero-copy sending when the ASGI server offers
+    the http.response.pathsend extension; uvicorn doesn't, so the file is read in chunks on a
+    worker thread and larger chunks mean far fewer thread hops and send() calls per file.
+    """
+    chunk_size = 1024 * 1024
+
+def _file_etag(st: os.stat_result) -> str:
+    # inode + size + mtime identify a file version without hashing its content
+    return f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+def _not_modified(request: Request, etag: str, st: os.stat_result) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since (RFC 9110 13.1.2-13.1.3)"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        # Weak comparison; If-Modified-Since is ignored when If-None-Match is present
+        if if_none_match.strip() == '*':
+            return True
+        return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False  # Invalid dates are ignored
+        return int(st.st_mtime) <= since
+    return False
+
 @app.get("/download/{filename}")
-async def get_file(filename: str):
-    """Retrieve downloaded audio file"""
-    file_path = TEMP_DIR / filename
+async def get_file(filename: str, request: Request):
+    """Retrieve downloaded audio file (304 when the client's cached copy is current)"""
+    file_path = os.path.join(TEMP_DIR, filename)
     
-    if not file_path.exists():
+    # One stat both checks the file and is handed to the response (which would stat again)
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
+    if not stat.S_ISREG(st.st_mode):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    etag = _file_etag(st)
+    if _not_modified(request, etag, st):
+        return Response(status_code=304, headers={
+            'etag': etag,
+            'last-modified': formatdate(st.st_mtime, usegmt=True),
+        })
     
-    return FileResponse(
+    # Starlette serves Range requests itself (206 + Content-Range, Accept-Ranges: bytes) and
+    # keeps this ETag, so If-Range checks agree with the 304 ones
+    return AudioFileResponse(
         path=file_path,
-        media_type='audio/mpeg',
-        filename=filename
+        headers={'etag': etag},
+        media_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        filename=filename,
+        stat_result=st
     )
 
 @app.delete("/download/{filename}")
 async def delete_file(filename: str):
     """Delete downloaded audio file"""
-    file_path = TEMP_DIR / filename
-    
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
+    file_path = os.path.join(TEMP_DIR, filename)
     
+    # unlink reports a missing file itself; no separate exists() check
     try:
-        file_path.unlink()
+        os.unlink(file_path)
         return {"success": True, "message": "File deleted"}
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete file: {str(e)}")
 
+def _sweep_temp_dir(max_age_seconds: float) -> int:
+    """Unlink regular files in TEMP_DIR older than max_age_seconds; returns count removed"""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    # scandir takes the file type from the directory listing; only the mtime needs a stat call
+    with os.scandir(TEMP_DIR) as it:
+        for entry in it:
+            try:
+                if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # Deleted concurrently (DELETE endpoint / cookies cleanup)
+    return removed
+
+async def _sweeper():
+    max_age_seconds = MAX_FILE_AGE_HOURS * 3600
+    while True:
+        try:
+            removed = await asyncio.to_thread(_sweep_temp_dir, max_age_seconds)
+            if removed:
+                logger.info(f"Cleanup removed {removed} expired files")
+        except Exception as e:
+            logger.error(f"Cleanup error: {e}")
+        await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+
+_sweeper_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_sweeper():
+    """Start the periodic TEMP_DIR cleanup"""
+    global _sweeper_task
+    _sweeper_task = asyncio.create_task(_sweeper())
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "yt-dlp API"}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    # Workers are spawned as fresh processes, so they need an import string, not the app object.
+    # Per-process state (yt-dlp pool, metadata cache, in-flight coalescing) only loses sharing
+    # across workers; files live in the shared TEMP_DIR and the download cap is server-wide.
+    workers = int(os.environ.get("WEB_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+    uvicorn.run(
+        f"{os.path.splitext(os.path.basename(__file__))[0]}:app",
+        host="0.0.0.0",
+        port=8080,
+        loop="uvloop",
+        http="httptools",
+        workers=workers,
+    )
\ No newline at end of file